@@ -1,9 +1,172 @@
-import boto3
+import functools
+import hashlib
 import json
 import os
 import argparse
-from botocore.exceptions import ClientError
-from datetime import datetime, timezone
+import copy
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Union
+
+# boto3 and botocore are imported where they are first needed so that --help,
+# argument errors and missing credentials return without paying their import cost;
+# these imports only serve the type annotations
+if TYPE_CHECKING:
+    import boto3
+    import botocore.session
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
+    from botocore.hooks import HierarchicalEmitter
+    from botocore.loaders import Loader
+
+# Client settings shared by every STS client so the identity check and
+# AssumeRole calls reuse one kept-alive connection instead of re-handshaking.
+# Adaptive retries rate-limit the client when STS starts throttling, which
+# matters when many accounts are troubleshot in parallel. total_max_attempts counts
+# the first request, so each call is tried at most 3 times
+STS_CLIENT_SETTINGS = {
+    'tcp_keepalive': True,
+    'retries': {'total_max_attempts': 3, 'mode': 'adaptive'},
+    'max_pool_connections': 4
+}
+
+# Assumed role credentials are cached alongside the AWS CLI's own cache and
+# reused until they are this close to expiring
+CREDENTIAL_CACHE_DIR = Path.home() / '.aws' / 'cli' / 'cache'
+CREDENTIAL_EXPIRY_WINDOW = timedelta(minutes=5)
+
+# Environment variables that must be set (and non-empty) to build the source session
+REQUIRED_ENV_VARS = frozenset({'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'})
+
+# Upper bound on accounts troubleshot concurrently, keeping well under STS request quotas
+MAX_WORKERS = 20
+
+# Partition and region information, keyed by whether the account is in GovCloud
+PARTITION_INFO = {
+    True: {
+        'partition': 'aws-us-gov',
+        'role_arn_template': 'arn:aws-us-gov:iam::{account_id}:role/{role_name}',
+        'root_arn_template': 'arn:aws-us-gov:iam::{account_id}:root',
+        'default_region': 'us-gov-west-1',
+        'valid_regions': frozenset({'us-gov-west-1', 'us-gov-east-1'})
+    },
+    False: {
+        'partition': 'aws',
+        'role_arn_template': 'arn:aws:iam::{account_id}:role/{role_name}',
+        'root_arn_template': 'arn:aws:iam::{account_id}:root',
+        'default_region': 'us-east-1',
+        'valid_regions': frozenset({'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2'})
+    }
+}
+
+
+# Policies suggested when AssumeRole is denied, written out as str.format templates
+# (literal braces doubled) so the error path only has to substitute the ARNs
+TRUST_POLICY_TEMPLATE = """{{
+  "Version": "2012-10-17",
+  "Statement": [
+    {{
+      "Effect": "Allow",
+      "Principal": {{
+        "AWS": "{principal_arn}"
+      }},
+      "Action": "sts:AssumeRole"
+    }}
+  ]
+}}"""
+
+PERMISSION_POLICY_TEMPLATE = """{{
+  "Version": "2012-10-17",
+  "Statement": [
+    {{
+      "Effect": "Allow",
+      "Action": "sts:AssumeRole",
+      "Resource": [
+        "{role_arn}"
+      ]
+    }}
+  ]
+}}"""
+
+
+def force_keep_alive(request, **kwargs):
+    """
+    Event handler that sets an explicit keep-alive header on outgoing STS requests
+
+    Parameters:
+        request (AWSRequest): The request botocore is about to send
+    """
+    request.headers['Connection'] = 'keep-alive'
+
+
+@functools.lru_cache(maxsize=None)
+def get_sts_client_config() -> 'Config':
+    """
+    Returns the botocore Config shared by every STS client
+
+    Returns:
+        Config: Client configuration built from STS_CLIENT_SETTINGS
+    """
+    from botocore.config import Config
+    return Config(**STS_CLIENT_SETTINGS)
+
+
+@functools.lru_cache(maxsize=None)
+def get_data_loader(data_path: str = None) -> 'Loader':
+    """
+    Returns the service model loader shared by every session so models are read from disk only once
+
+    Parameters:
+        data_path (str): Extra model search paths, as in botocore's data_path setting (AWS_DATA_PATH)
+
+    Returns:
+        Loader: The shared botocore data loader for that search path
+    """
+    import botocore.loaders
+    return botocore.loaders.create_loader(data_path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_event_hooks() -> 'HierarchicalEmitter':
+    """
+    Returns an event emitter holding botocore's builtin handlers and the keep-alive handler
+
+    Registering botocore's builtin handlers is the bulk of the cost of creating a session,
+    so it is done once here and each new session starts from a copy.
+
+    Returns:
+        HierarchicalEmitter: The template emitter; copy it before registering more handlers
+    """
+    import botocore.session
+    from botocore.hooks import HierarchicalEmitter
+    event_hooks = HierarchicalEmitter()
+    botocore.session.Session(event_hooks=event_hooks).register('request-created.sts', force_keep_alive)
+    return event_hooks
+
+
+def create_botocore_session() -> 'botocore.session.Session':
+    """
+    Create a botocore session that shares the model loader and event handlers built for earlier sessions
+
+    The source and assumed role sessions (and every account in a parallel run) only
+    differ in credentials, so they reuse one data loader, which caches the parsed
+    service models and endpoints.json, and a copy of one pre-built handler table.
+
+    Returns:
+        botocore.session.Session: A session without credentials, ready to wrap in boto3.Session
+    """
+    import botocore.session
+    botocore_session = botocore.session.Session(event_hooks=copy.copy(get_event_hooks()),
+                                                include_builtin_handlers=False)
+    # Same search path botocore's default loader would use, so AWS_DATA_PATH still applies
+    data_path = botocore_session.get_config_variable('data_path')
+    botocore_session.register_component('data_loader', get_data_loader(data_path))
+    return botocore_session
+
 
 def get_partition_info(is_govcloud: bool) -> dict:
     """
@@ -13,35 +176,180 @@ def get_partition_info(is_govcloud: bool) -> dict:
     is_govcloud (bool): Indicates if the environment is GovCloud or commercial
 
     Returns:
-    dict: A dictionary containing partition, default_region, and valid_regions
+    dict: A dictionary containing partition, role/root ARN templates, default_region, and valid_regions (a frozenset)
     """
-    return {
-        'partition': 'aws-us-gov' if is_govcloud else 'aws',
-        'default_region': 'us-gov-west-1' if is_govcloud else 'us-east-1',
-        'valid_regions': ['us-gov-west-1', 'us-gov-east-1'] if is_govcloud else ['us-east-1', 'us-east-2', 'us-west-1', 'us-west-2']
-    }
+    return PARTITION_INFO[bool(is_govcloud)]
+
+
+def get_cache_path(target_account_id: str, role_name: str, region: str, caller_arn: str,
+                   session_duration: int) -> Path:
+    """
+    Returns the cache file used for an AssumeRole response
 
+    Parameters:
+        target_account_id (str): The AWS account ID the role lives in
+        role_name (str): Name of the role to assume
+        region (str): AWS region the credentials were requested in
+        caller_arn (str): ARN of the identity assuming the role
+        session_duration (int): Requested session duration in seconds
 
-def get_error_details(error: ClientError) -> tuple:
+    Returns:
+        Path: Location of the JSON cache file for this combination
     """
-    Extract error message and code from a ClientError exception
+    key = hashlib.sha1(
+        f"{target_account_id}|{role_name}|{region}|{caller_arn}|{session_duration}".encode()
+    ).hexdigest()
+    return CREDENTIAL_CACHE_DIR / f"{key}.json"
 
-    This function takes a ClientError exception as input and returns a tuple containing the error message and code.
-    The error message is extracted from the 'response' attribute of the exception, and the code is extracted from the 'Error'
-    attribute of the response dictionary. If either the response or the 'Error' attribute does not exist, the function will return
-    the original exception as a string and 'Unknown' as the code.
+
+def load_cached_credentials(cache_path: Path):
+    """
+    Load a cached AssumeRole response if it exists and is not about to expire
 
     Parameters:
-        error (ClientError): The ClientError exception to extract error details from
+        cache_path (Path): Location of the JSON cache file
 
     Returns:
-        tuple: A tuple containing the error message and code
+        dict: The cached AssumeRole response, or None if missing, unreadable or expiring
+    """
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        expiration = datetime.fromisoformat(cached['Credentials']['Expiration'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if expiration - CREDENTIAL_EXPIRY_WINDOW <= datetime.now(timezone.utc):
+        return None
+
+    cached['Credentials']['Expiration'] = expiration
+    return cached
+
+
+def save_cached_credentials(cache_path: Path, assumed_role: dict):
+    """
+    Atomically write an AssumeRole response to the cache with owner-only permissions
+
+    Parameters:
+        cache_path (Path): Location of the JSON cache file
+        assumed_role (dict): The AssumeRole response to cache
+
+    Raises:
+        OSError: If the cache directory or file cannot be written
+    """
+    cached = {key: value for key, value in assumed_role.items() if key != 'ResponseMetadata'}
+    cached['Credentials'] = dict(assumed_role['Credentials'],
+                                 Expiration=assumed_role['Credentials']['Expiration'].isoformat())
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # mkstemp creates the file with mode 0600
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def create_assumed_session(session: 'boto3.Session',
+                           assumed_role: dict,
+                           role_arn: str,
+                           region: str,
+                           session_duration: int,
+                           use_cache: bool = False) -> 'boto3.Session':
+    """
+    Build a session for the assumed role that refreshes its own credentials
+
+    The session starts with the credentials from the given AssumeRole response and
+    calls AssumeRole again through the source session shortly before they expire,
+    so long-running callers never have to re-run the troubleshooter.
+
+    Parameters:
+        session (boto3.Session): Session holding the source credentials
+        assumed_role (dict): The AssumeRole response to start from
+        role_arn (str): ARN of the assumed role
+        region (str): AWS region for the assumed session
+        session_duration (int): Duration in seconds for each refreshed session
+        use_cache (bool): Keep refreshed credentials in CREDENTIAL_CACHE_DIR instead of
+            only in memory
+
+    Returns:
+        boto3.Session: A session whose credentials refresh automatically
     """
-def get_error_details(error: ClientError) -> tuple:
+    import boto3
+    from botocore.credentials import AssumeRoleCredentialFetcher, RefreshableCredentials
+    from botocore.utils import JSONFileCache
+
+    fetcher = AssumeRoleCredentialFetcher(
+        client_creator=functools.partial(session.client, config=get_sts_client_config()),
+        source_credentials=session.get_credentials(),
+        role_arn=role_arn,
+        extra_args={
+            'DurationSeconds': session_duration,
+            'RoleSessionName': 'TroubleshootingSession'
+        },
+        cache=JSONFileCache(str(CREDENTIAL_CACHE_DIR)) if use_cache else {},
+        expiry_window_seconds=int(CREDENTIAL_EXPIRY_WINDOW.total_seconds())
+    )
+
+    temp_credentials = assumed_role['Credentials']
+    credentials = RefreshableCredentials.create_from_metadata(
+        metadata={
+            'access_key': temp_credentials['AccessKeyId'],
+            'secret_key': temp_credentials['SecretAccessKey'],
+            'token': temp_credentials['SessionToken'],
+            'expiry_time': temp_credentials['Expiration'].isoformat()
+        },
+        refresh_using=fetcher.fetch_credentials,
+        method='assume-role'
+    )
+
+    botocore_session = create_botocore_session()
+    botocore_session._credentials = credentials
+    return boto3.Session(botocore_session=botocore_session, region_name=region)
+
+
+def flush_output(out: list, err: list, prefix: str = ''):
+    """
+    Write buffered report lines in one call per stream
+
+    Parameters:
+        out (list): Lines destined for stdout
+        err (list): Lines destined for stderr
+        prefix (str): Text prepended to every output line, e.g. the account ID
     """
-    Extract error message and code from a ClientError exception
+    for stream, lines in ((sys.stdout, out), (sys.stderr, err)):
+        if not lines:
+            continue
+        text = "\n".join(lines)
+        if prefix:
+            # Leave blank separator lines blank rather than a bare prefix
+            text = "\n".join(prefix + line if line else line for line in text.split("\n"))
+        stream.write(text + "\n")
+        stream.flush()
+
+
+def get_error_details(error: 'Union[ClientError, BotoCoreError]') -> tuple:
+    """
+    Extract error message and code from a ClientError or BotoCoreError exception
+
+    This function takes a botocore exception as input and returns a tuple containing the error message and code.
+    For a ClientError the error message is extracted from the 'response' attribute of the exception, and the code is extracted
+    from the 'Error' attribute of the response dictionary. If the 'Error' attribute does not exist, the function will return
+    the original exception as a string and 'Unknown' as the code. A BotoCoreError (connection failures, invalid parameters)
+    has no response, so the exception's class name is used as the code.
+
+    Parameters:
+        error (ClientError or BotoCoreError): The exception to extract error details from
+
+    Returns:
+        tuple: A tuple containing the error message and code
     """
-    response = getattr(error, 'response', {})
+    response = getattr(error, 'response', None)
+    if response is None:
+        return str(error), type(error).__name__
     error_dict = response.get('Error', {})
     return (
         error_dict.get('Message', str(error)),
@@ -49,16 +357,54 @@ def get_error_details(error: ClientError) -> tuple:
     )
 
 
+@dataclass
+class AssumeRoleResult:
+    """
+    Outcome of troubleshooting AssumeRole for one account
+
+    failed_step is None on success, otherwise one of 'region', 'credentials',
+    'caller_identity', 'assume_role' or 'validate'. Fields for steps that were not reached
+    stay None; on a 'validate' failure AssumeRole succeeded, so credentials are still set.
+    """
+    ok: bool
+    account_id: str
+    is_govcloud: bool = False
+    partition: str = None
+    region: str = None
+    role_arn: str = None
+    session_duration: int = None
+    using_session_token: bool = False
+    caller_arn: str = None
+    caller_account: str = None
+    from_cache: bool = False
+    cache_path: str = None
+    cache_warning: str = None
+    assumed_role_arn: str = None
+    assumed_role_id: str = None
+    assumed_identity_arn: str = None
+    credentials: dict = None
+    expires_at: datetime = None
+    failed_step: str = None
+    missing_vars: list = None
+    error_code: str = None
+    error_message: str = None
+    assumed_session: 'boto3.Session' = field(default=None, repr=False, compare=False)
+
+
 def troubleshoot_assume_role(target_account_id: str, 
                             is_govcloud: bool = False,
                             region: str = None,
                             role_name: str = "OrganizationAccountAccessRole",
-                            session_duration: int = 3600):
+                            session_duration: int = 3600,
+                            validate: bool = False,
+                            use_cache: bool = False) -> AssumeRoleResult:
     """
     Troubleshoot AssumeRole issues within AWS Organizations using environment variables.
     
     Required: AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
     Optional: AWS_SESSION_TOKEN (required for temporary credentials)
+
+    Nothing is printed; pass the result to render() for the human-readable report.
     
     Args:
         target_account_id (str): The AWS account ID to assume role into
@@ -66,159 +412,288 @@ def troubleshoot_assume_role(target_account_id: str,
         region (str): AWS region to use
         role_name (str): Name of the role to assume
         session_duration (int): Duration in seconds for assumed role session
+        validate (bool): Make a test API call with the assumed role credentials
+        use_cache (bool): Reuse unexpired credentials cached by an earlier run instead of
+            calling AssumeRole. A cache hit does not re-test the role's trust or permissions
+
+    Returns:
+        AssumeRoleResult: The outcome, including credentials and an auto-refreshing
+        assumed_session on success
     """
     # Get partition information
     partition_info = get_partition_info(is_govcloud)
+    result = AssumeRoleResult(ok=False, account_id=target_account_id, is_govcloud=is_govcloud,
+                              partition=partition_info['partition'])
     
-    # Set region
-    if not region:
-        region = partition_info['default_region']
-    elif region not in partition_info['valid_regions']:
-        print(f"❌ Invalid region '{region}' for {'GovCloud' if is_govcloud else 'Commercial'}")
-        print(f"Valid regions: {', '.join(partition_info['valid_regions'])}")
-        return
+    # Set region, falling back to the partition default (which is always valid)
+    region = region or partition_info['default_region']
+    result.region = region
+    if region not in partition_info['valid_regions']:
+        result.failed_step = 'region'
+        result.error_code = 'InvalidRegion'
+        result.error_message = f"Invalid region '{region}'"
+        return result
+
+    # Snapshot the environment once so concurrent changes can't split the credentials;
+    # empty variables are dropped so they count as missing
+    env = {var: value for var, value in os.environ.items() if value}
 
     # Verify required environment variables
-    required_vars = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY']
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    missing_vars = sorted(REQUIRED_ENV_VARS - env.keys())
 
     if missing_vars:
-        print("❌ Missing required environment variables:")
-        for var in missing_vars:
-            print(f"  - {var}")
-        return
-
-    # Initialize session using environment variables
-    session_kwargs = {
-        'aws_access_key_id': os.getenv('AWS_ACCESS_KEY_ID'),
-        'aws_secret_access_key': os.getenv('AWS_SECRET_ACCESS_KEY'),
-        'region_name': region
-    }
-    
-    # Add session token if present
-    if os.getenv('AWS_SESSION_TOKEN'):
-        session_kwargs['aws_session_token'] = os.getenv('AWS_SESSION_TOKEN')
-    
-    session = boto3.Session(**session_kwargs)
-    
-    print(f"=== Starting Role Access Troubleshooting ===")
-    print(f"Partition: {partition_info['partition']}")
-    print(f"Region: {region}")
-    print(f"Using temporary credentials: {'Yes' if 'aws_session_token' in session_kwargs else 'No'}\n")
+        result.failed_step = 'credentials'
+        result.missing_vars = missing_vars
+        result.error_code = 'MissingCredentials'
+        result.error_message = f"Missing environment variables: {', '.join(missing_vars)}"
+        return result
+
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    # Initialize session using environment variables; an unset session token is passed as None
+    session_token = env.get('AWS_SESSION_TOKEN')
+    result.using_session_token = session_token is not None
+    session = boto3.Session(
+        botocore_session=create_botocore_session(),
+        aws_access_key_id=env['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=env['AWS_SECRET_ACCESS_KEY'],
+        aws_session_token=session_token,
+        region_name=region
+    )
     
     # 1. Get current identity first
-    sts = session.client('sts')
+    sts = session.client('sts', config=get_sts_client_config())
     try:
         caller_identity = sts.get_caller_identity()
-        print(f"✓ Current identity:")
-        print(f"  User: {caller_identity['Arn']}")
-        print(f"  Account: {caller_identity['Account']}")
-    except ClientError as e:
-        error_msg, error_code = get_error_details(e)
-        if error_code == "ExpiredToken":
-            print("❌ Your session token has expired. Please refresh your credentials and try again.")
-        elif error_code == "InvalidClientTokenId":
-            print("❌ The AWS access key ID does not exist or is invalid. Verify your credentials.")
-        else:
-            print(f"✗ Error getting caller identity: {error_msg}")
-            print(f"  Error Code: {error_code}")
-        return
+        result.caller_arn = caller_identity['Arn']
+        result.caller_account = caller_identity['Account']
+    except (ClientError, BotoCoreError) as e:
+        result.failed_step = 'caller_identity'
+        result.error_message, result.error_code = get_error_details(e)
+        return result
 
     # 2. Try to assume the role
-    role_arn = f"arn:{partition_info['partition']}:iam::{target_account_id}:role/{role_name}"
-    print(f"\nTesting assume role to: {role_arn}")
-    print(f"Requested session duration: {session_duration} seconds")
+    role_arn = partition_info['role_arn_template'].format(account_id=target_account_id, role_name=role_name)
+    result.role_arn = role_arn
+    result.session_duration = session_duration
+
+    cache_path = None
+    if use_cache:
+        cache_path = get_cache_path(target_account_id, role_name, region, caller_identity['Arn'],
+                                    session_duration)
+        result.cache_path = str(cache_path)
 
     try:
-        assumed_role = sts.assume_role(
-            RoleArn=role_arn,
-            RoleSessionName="TroubleshootingSession",
-            DurationSeconds=session_duration
-        )
-        print("✓ Successfully assumed role!")
-        
-        # Print assumed role details
-        print("\nAssumed Role Details:")
-        print(f"  Role ARN: {assumed_role['AssumedRoleUser']['Arn']}")
-        print(f"  Session Name: {assumed_role['AssumedRoleUser']['AssumedRoleId']}")
-        print(f"  Expiration: {assumed_role['Credentials']['Expiration'].strftime('%Y-%m-%d %H:%M:%S %Z')}")
-        
-        # Try to validate account access with assumed role
-        temp_credentials = assumed_role['Credentials']
-        assumed_session = boto3.Session(
-            aws_access_key_id=temp_credentials['AccessKeyId'],
-            aws_secret_access_key=temp_credentials['SecretAccessKey'],
-            aws_session_token=temp_credentials['SessionToken'],
-            region_name=region
-        )
-        
-        # Try a simple API call with assumed role
-        assumed_sts = assumed_session.client('sts')
-        assumed_identity = assumed_sts.get_caller_identity()
-        print(f"\n✓ Successfully validated assumed role:")
-        print(f"  Assumed Identity: {assumed_identity['Arn']}")
-        
+        # Only skip the AssumeRole test when the caller opted into cached credentials
+        assumed_role = load_cached_credentials(cache_path) if use_cache else None
+        if assumed_role:
+            result.from_cache = True
+        else:
+            assumed_role = sts.assume_role(
+                RoleArn=role_arn,
+                RoleSessionName="TroubleshootingSession",
+                DurationSeconds=session_duration
+            )
+            if use_cache:
+                try:
+                    save_cached_credentials(cache_path, assumed_role)
+                except OSError as e:
+                    result.cache_warning = str(e)
+    except (ClientError, BotoCoreError) as e:
+        result.failed_step = 'assume_role'
+        result.error_message, result.error_code = get_error_details(e)
+        return result
+
+    result.assumed_role_arn = assumed_role['AssumedRoleUser']['Arn']
+    result.assumed_role_id = assumed_role['AssumedRoleUser']['AssumedRoleId']
+    result.expires_at = assumed_role['Credentials']['Expiration']
+    result.credentials = assumed_role['Credentials']
+    result.assumed_session = create_assumed_session(session, assumed_role, role_arn,
+                                                    region, session_duration, use_cache)
+
+    # 3. The AssumeRole response already names the assumed identity, so only
+    # spend an extra STS call on a test API call when asked to
+    if validate:
+        try:
+            assumed_sts = result.assumed_session.client('sts', config=get_sts_client_config())
+            result.assumed_identity_arn = assumed_sts.get_caller_identity()['Arn']
+        except (ClientError, BotoCoreError) as e:
+            result.failed_step = 'validate'
+            result.error_message, result.error_code = get_error_details(e)
+            return result
+
+    result.ok = True
+    return result
+
+
+def render(result: AssumeRoleResult) -> tuple:
+    """
+    Render the human-readable troubleshooting report for a result
+
+    Parameters:
+        result (AssumeRoleResult): The outcome returned by troubleshoot_assume_role
+
+    Returns:
+        tuple: Lists of report lines for stdout and of error/troubleshooting lines for stderr
+    """
+    out = []
+    err = []
+    partition_info = get_partition_info(result.is_govcloud)
+
+    if result.failed_step == 'region':
+        err.append(f"❌ Invalid region '{result.region}' for {'GovCloud' if result.is_govcloud else 'Commercial'}")
+        err.append(f"Valid regions: {', '.join(sorted(partition_info['valid_regions']))}")
+        return out, err
+
+    if result.failed_step == 'credentials':
+        err.append("❌ Missing required environment variables:")
+        for var in result.missing_vars:
+            err.append(f"  - {var}")
+        return out, err
+
+    out.append(f"=== Starting Role Access Troubleshooting ===")
+    out.append(f"Partition: {result.partition}")
+    out.append(f"Region: {result.region}")
+    out.append(f"Using temporary credentials: {'Yes' if result.using_session_token else 'No'}\n")
+
+    if result.failed_step == 'caller_identity':
+        if result.error_code == "ExpiredToken":
+            err.append("❌ Your session token has expired. Please refresh your credentials and try again.")
+        elif result.error_code == "InvalidClientTokenId":
+            err.append("❌ The AWS access key ID does not exist or is invalid. Verify your credentials.")
+        else:
+            err.append(f"✗ Error getting caller identity: {result.error_message}")
+            err.append(f"  Error Code: {result.error_code}")
+        return out, err
+
+    out.append(f"✓ Current identity:")
+    out.append(f"  User: {result.caller_arn}")
+    out.append(f"  Account: {result.caller_account}")
+
+    out.append(f"\nTesting assume role to: {result.role_arn}")
+    out.append(f"Requested session duration: {result.session_duration} seconds")
+
+    if result.assumed_role_arn:
+        if result.from_cache:
+            out.append(f"✓ Using cached credentials from {result.cache_path}")
+            out.append("  AssumeRole was not re-tested; run without --use-cache to test the role")
+        else:
+            out.append("✓ Successfully assumed role!")
+        if result.cache_warning:
+            err.append(f"  Warning: could not cache credentials: {result.cache_warning}")
+
+        out.append("\nAssumed Role Details:")
+        out.append(f"  Role ARN: {result.assumed_role_arn}")
+        out.append(f"  Session Name: {result.assumed_role_id}")
+        out.append(f"  Expiration: {result.expires_at.isoformat(sep=' ', timespec='seconds')}")
+
+    if result.ok:
+        if result.assumed_identity_arn:
+            out.append(f"\n✓ Successfully validated assumed role:")
+            out.append(f"  Assumed Identity: {result.assumed_identity_arn}")
+
         # Print sample commands for using these credentials
-        print("\nTo use these credentials, set the following environment variables:")
-        print(f"export AWS_ACCESS_KEY_ID={temp_credentials['AccessKeyId']}")
-        print(f"export AWS_SECRET_ACCESS_KEY={temp_credentials['SecretAccessKey']}")
-        print(f"export AWS_SESSION_TOKEN={temp_credentials['SessionToken']}")
-        
-        return assumed_role
-        
-    except ClientError as e:
-        error_msg, error_code = get_error_details(e)
-        print(f"\n✗ AssumeRole failed: {error_msg}")
-        print(f"  Error Code: {error_code}")
-        
-        # Enhanced error analysis
-        if error_code == "ExpiredToken":
-            print("\n❌ Your session token has expired. Please refresh your credentials and try again.")
-        elif error_code == "AccessDenied":
-            print("\nTroubleshooting steps:")
-            print("\n1. Verify the role trust policy in target account matches:")
-            print(json.dumps({
-                "Version": "2012-10-17",
-                "Statement": [{
-                    "Effect": "Allow",
-                    "Principal": {
-                        "AWS": f"arn:{partition_info['partition']}:iam::{caller_identity['Account']}:root"
-                    },
-                    "Action": "sts:AssumeRole"
-                }]
-            }, indent=2))
-            print("\n2. Verify you have the required IAM permissions:")
-            print(json.dumps({
-                "Version": "2012-10-17",
-                "Statement": [{
-                    "Effect": "Allow",
-                    "Action": "sts:AssumeRole",
-                    "Resource": [role_arn]
-                }]
-            }, indent=2))
-        elif error_code == "MalformedPolicyDocument":
-            print("\n- The trust relationship policy might be malformed")
-        return None
+        out.append("\nTo use these credentials, set the following environment variables:")
+        out.append(f"export AWS_ACCESS_KEY_ID={result.credentials['AccessKeyId']}")
+        out.append(f"export AWS_SECRET_ACCESS_KEY={result.credentials['SecretAccessKey']}")
+        out.append(f"export AWS_SESSION_TOKEN={result.credentials['SessionToken']}")
+        return out, err
+
+    if result.failed_step == 'validate':
+        err.append(f"\n✗ Validating the assumed role failed: {result.error_message}")
+        err.append(f"  Error Code: {result.error_code}")
+        return out, err
+
+    err.append(f"\n✗ AssumeRole failed: {result.error_message}")
+    err.append(f"  Error Code: {result.error_code}")
+
+    # Enhanced error analysis
+    if result.error_code == "ExpiredToken":
+        err.append("\n❌ Your session token has expired. Please refresh your credentials and try again.")
+    elif result.error_code == "AccessDenied":
+        err.append("\nTroubleshooting steps:")
+        err.append("\n1. Verify the role trust policy in target account matches:")
+        err.append(TRUST_POLICY_TEMPLATE.format(
+            principal_arn=partition_info['root_arn_template'].format(account_id=result.caller_account)
+        ))
+        err.append("\n2. Verify you have the required IAM permissions:")
+        err.append(PERMISSION_POLICY_TEMPLATE.format(role_arn=result.role_arn))
+    elif result.error_code == "MalformedPolicyDocument":
+        err.append("\n- The trust relationship policy might be malformed")
+    return out, err
+
+
+def result_to_json(result: AssumeRoleResult) -> str:
+    """
+    Serialize a result as a single line of JSON for machine consumption
+
+    Parameters:
+        result (AssumeRoleResult): The outcome returned by troubleshoot_assume_role
+
+    Returns:
+        str: The result's fields (except assumed_session) as JSON, with datetimes in ISO-8601
+    """
+    data = {f.name: getattr(result, f.name) for f in fields(result) if f.name != 'assumed_session'}
+    return json.dumps(data, default=lambda value: value.isoformat())
+
 
 def main():
-    parser = argparse.ArgumentParser(description='AWS Role Access Troubleshooter')
-    parser.add_argument('account_id', help='Target AWS account ID')
-    parser.add_argument('--govcloud', action='store_true', help='Use GovCloud partition')
-    parser.add_argument('--region', help='AWS region')
+    # Read --govcloud first so the valid --region choices match the partition
+    partition_parser = argparse.ArgumentParser(add_help=False)
+    partition_parser.add_argument('--govcloud', action='store_true', help='Use GovCloud partition')
+    partition_args, _ = partition_parser.parse_known_args()
+    partition_info = get_partition_info(partition_args.govcloud)
+
+    parser = argparse.ArgumentParser(description='AWS Role Access Troubleshooter',
+                                     parents=[partition_parser])
+    parser.add_argument('account_id', nargs='+', help='Target AWS account ID(s)')
+    parser.add_argument('--region', choices=sorted(partition_info['valid_regions']),
+                        help=f"AWS region (default: {partition_info['default_region']})")
     parser.add_argument('--role-name', default='OrganizationAccountAccessRole',
                         help='Role name to assume (default: OrganizationAccountAccessRole)')
     parser.add_argument('--duration', type=int, default=3600,
                         help='Session duration in seconds (default: 3600)')
+    parser.add_argument('--validate', action='store_true',
+                        help='Make a test API call with the assumed role credentials')
+    parser.add_argument('--use-cache', action='store_true',
+                        help='Reuse unexpired cached credentials instead of re-testing AssumeRole')
+    parser.add_argument('--format', choices=['text', 'json'],
+                        help='Output format (default: text on a terminal, otherwise one JSON object per account)')
     
     args = parser.parse_args()
+    output_format = args.format or ('text' if sys.stdout.isatty() else 'json')
     
-    troubleshoot_assume_role(
-        target_account_id=args.account_id,
-        is_govcloud=args.govcloud,
-        region=args.region,
-        role_name=args.role_name,
-        session_duration=args.duration
-    )
+    all_ok = True
+
+    # Accounts are independent, so troubleshoot them concurrently and report each as it finishes
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(args.account_id))) as pool:
+        futures = {
+            pool.submit(
+                troubleshoot_assume_role,
+                target_account_id=account_id,
+                is_govcloud=args.govcloud,
+                region=args.region,
+                role_name=args.role_name,
+                session_duration=args.duration,
+                validate=args.validate,
+                use_cache=args.use_cache
+            ): account_id
+            for account_id in args.account_id
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            all_ok = all_ok and result.ok
+            if output_format == 'json':
+                flush_output([result_to_json(result)], [])
+                continue
+            out, err = render(result)
+            # Only label lines when reports from several accounts are interleaved
+            prefix = f"[{futures[future]}] " if len(args.account_id) > 1 else ''
+            flush_output(out, err, prefix)
+
+    # Let scripts detect failures without parsing the report
+    sys.exit(0 if all_ok else 1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()